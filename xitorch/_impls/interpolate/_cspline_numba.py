@@ -0,0 +1,93 @@
+import importlib.util
+import numpy as np
+
+# numba is an optional dependency, it is only used to speed up the cubic spline
+# evaluation on CPU when no gradient is required and the interval search of
+# monotonic queries.
+# It is only imported and compiled on the first use, so importing xitorch does
+# not pay the import nor the compilation time.
+numba_available = importlib.util.find_spec("numba") is not None
+numba = None
+_compiled_eval = None
+_compiled_search = None
+
+# maximum number of steps to walk from the hint before falling back to the
+# binary search
+_MAX_WALK = 8
+
+__all__ = ["numba_available", "cspline_eval", "hinted_search"]
+
+def _cspline_eval(idxl, xdx, pcoef, xq):
+    # evaluate the cubic spline at the query points in a single pass
+    # idxl: int64 (nrq,) the index of the segment for every query point
+    # xdx: float64 (nr-1, 2) the left position and width of every segment
+    # pcoef: float64 (nbatch, nr-1, 4) the coefficients of the t-polynomial
+    # xq: float64 (nrq,) the query points
+    # returns float64 (nbatch, nrq)
+    nbatch = pcoef.shape[0]
+    nrq = xq.shape[0]
+    yq = np.empty((nbatch, nrq), dtype=pcoef.dtype)
+    for i in numba.prange(nrq):
+        j = idxl[i]
+        t = (xq[i] - xdx[j, 0]) / xdx[j, 1]
+        for b in range(nbatch):
+            yq[b, i] = ((pcoef[b, j, 3] * t + pcoef[b, j, 2]) * t + pcoef[b, j, 1]) * t + pcoef[b, j, 0]
+    return yq
+
+def _hinted_search(x, xq, hint):
+    # find the same index as np.searchsorted(x, xq) (i.e. the number of x < xq
+    # and nr for nan) by walking from the hint, so sorted xq takes a single
+    # merge-like pass over x and xq
+    # x: (nr,) sorted in ascending order
+    # xq: (nrq,) the query points
+    # hint: int64 (nrq,) the starting index for every query point, or (0,) to
+    #     start from the index of the previous query point
+    # returns int64 (nrq,)
+    nr = x.shape[0]
+    nrq = xq.shape[0]
+    use_hint = hint.shape[0] == nrq
+    idx = np.empty(nrq, dtype=np.int64)
+    j = 0
+    for i in range(nrq):
+        v = xq[i]
+        if v != v:
+            idx[i] = nr
+            continue
+        if use_hint:
+            j = min(max(hint[i], 0), nr)
+        if j < nr and x[j] < v:
+            k = 0
+            while j < nr and x[j] < v and k < _MAX_WALK:
+                j += 1
+                k += 1
+            if j < nr and x[j] < v:
+                j += np.searchsorted(x[j:], v)
+        else:
+            k = 0
+            while j > 0 and x[j - 1] >= v and k < _MAX_WALK:
+                j -= 1
+                k += 1
+            if j > 0 and x[j - 1] >= v:
+                j = np.searchsorted(x[:j], v)
+        idx[i] = j
+    return idx
+
+def _import_numba():
+    global numba
+    if not numba_available:
+        raise ImportError("numba is required to use the numba kernels")
+    import numba
+
+def cspline_eval(idxl, xdx, pcoef, xq):
+    global _compiled_eval
+    if _compiled_eval is None:
+        _import_numba()
+        _compiled_eval = numba.njit(parallel=True, fastmath={"contract"}, cache=True)(_cspline_eval)
+    return _compiled_eval(idxl, xdx, pcoef, xq)
+
+def hinted_search(x, xq, hint):
+    global _compiled_search
+    if _compiled_search is None:
+        _import_numba()
+        _compiled_search = numba.njit(cache=True)(_hinted_search)
+    return _compiled_search(x, xq, hint)
@@ -0,0 +1,36 @@
+import importlib.util
+import torch
+
+# triton is an optional dependency, it is only used to speed up the cubic
+# spline evaluation on GPU with kernel="triton" when no gradient is required.
+# The kernel module (and triton) is only imported on the first use, so
+# importing xitorch does not pay the import time of triton.
+triton_available = importlib.util.find_spec("triton") is not None
+_kernel_module = None
+
+__all__ = ["triton_available", "cspline_eval"]
+
+_BLOCK = 256
+
+def cspline_eval(idxl, xdx, pcoef, xq):
+    # evaluate the cubic spline at the query points with a single kernel
+    # idxl: int64 (nrq,) the index of the segment for every query point
+    # xdx: (nr-1, 2) the left position and width of every segment
+    # pcoef: (*BY, nr-1, 4) the coefficients of the t-polynomial
+    # xq: (nrq,) the query points
+    # returns (*BY, nrq)
+    global _kernel_module
+    if not triton_available:
+        raise ImportError("triton is required to use cspline_eval")
+    if _kernel_module is None:
+        from xitorch._impls.interpolate import _cspline_triton_kernel as _kernel_module
+    batch_shape = pcoef.shape[:-2]
+    nseg = pcoef.shape[-2]
+    nrq = xq.shape[-1]
+    pcoef = pcoef.reshape(-1, nseg, 4).contiguous()
+    nbatch = pcoef.shape[0]
+    yq = torch.empty((nbatch, nrq), dtype=xq.dtype, device=xq.device)
+    grid = ((nrq + _BLOCK - 1) // _BLOCK,)
+    _kernel_module.cspline_eval_kernel[grid](idxl.contiguous(), xdx.contiguous(), pcoef,
+                                             xq.contiguous(), yq, nseg, nrq, nbatch, BLOCK=_BLOCK)
+    return yq.reshape(*batch_shape, nrq)
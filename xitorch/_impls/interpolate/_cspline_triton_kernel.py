@@ -0,0 +1,36 @@
+import triton
+import triton.language as tl
+
+# the triton kernel of _cspline_triton, in a separate module so triton is only
+# imported when the kernel is used
+
+__all__ = ["cspline_eval_kernel"]
+
+@triton.jit
+def cspline_eval_kernel(idxl_ptr, xdx_ptr, pcoef_ptr, xq_ptr, yq_ptr,
+                        nseg, nrq, nbatch, BLOCK: tl.constexpr):
+    # every program evaluates BLOCK query points for all the batches, so
+    # the segment index and t are only loaded and calculated once
+    # the offsets are in int64, as nbatch * nrq can exceed the int32 range
+    pid = tl.program_id(0).to(tl.int64)
+    offs = pid * BLOCK + tl.arange(0, BLOCK)
+    mask = offs < nrq
+    j = tl.load(idxl_ptr + offs, mask=mask, other=0)
+    xq = tl.load(xq_ptr + offs, mask=mask, other=0.0)
+    xl = tl.load(xdx_ptr + 2 * j, mask=mask, other=0.0)
+    dx = tl.load(xdx_ptr + 2 * j + 1, mask=mask, other=1.0)
+    t = (xq - xl) / dx
+    # the pointers are moved to the next batch in every iteration instead
+    # of multiplying the batch index, so no int32 product can overflow
+    # (the 4 coefficients of a segment are next to each other)
+    pcoef_ptrs = pcoef_ptr + j * 4
+    yq_ptrs = yq_ptr + offs
+    for b in range(0, nbatch):
+        c0 = tl.load(pcoef_ptrs, mask=mask, other=0.0)
+        c1 = tl.load(pcoef_ptrs + 1, mask=mask, other=0.0)
+        c2 = tl.load(pcoef_ptrs + 2, mask=mask, other=0.0)
+        c3 = tl.load(pcoef_ptrs + 3, mask=mask, other=0.0)
+        yq = ((c3 * t + c2) * t + c1) * t + c0
+        tl.store(yq_ptrs, yq, mask=mask)
+        pcoef_ptrs += nseg * 4
+        yq_ptrs += nrq
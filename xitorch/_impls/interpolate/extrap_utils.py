@@ -2,6 +2,8 @@ import torch
 
 def get_extrap_pos(xqextrap, extrap, xmin=0.0, xmax=1.0):
     # xqextrap: (nrq,)
+    # the mapping is elementwise arithmetic, so it can also be applied on
+    # the points inside the region and selected afterwards
     xqnorm = (xqextrap - xmin) / (xmax - xmin)
     if extrap == "periodic":
         xqinside = xqnorm % 1.0
@@ -1,16 +1,25 @@
 import numpy as np
 import torch
 import warnings
+import weakref
 from abc import abstractmethod
 from xitorch._impls.interpolate.base_interp import BaseInterp
 from xitorch._impls.interpolate.extrap_utils import get_extrap_pos, get_extrap_val
+from xitorch._impls.interpolate import _cspline_numba, _cspline_triton
 
 class BaseInterp1D(BaseInterp):
-    def __init__(self, x, y=None, extrap=None, **unused):
+    def __init__(self, x, y=None, extrap=None, assume_sorted=True, monotonic=False, **unused):
         self._y_is_given = y is not None
         self._extrap = extrap
-        self._xmin = torch.min(x, dim=-1, keepdim=True)[0]
-        self._xmax = torch.max(x, dim=-1, keepdim=True)[0]
+        self._monotonic = monotonic
+        self._last_idx = None
+        # the search of the interval and the spline assume x is sorted in
+        # ascending order, so it is only checked if it is not assumed
+        if not assume_sorted and not bool(torch.all(x[...,1:] > x[...,:-1])):
+            raise RuntimeError("The input x must be sorted in a strictly ascending order")
+        self.x = x
+        self._xmin = x[...,:1]
+        self._xmax = x[...,-1:]
         self._is_periodic_required = False
 
     def set_periodic_required(self, val):
@@ -19,6 +28,30 @@ class BaseInterp1D(BaseInterp):
     def is_periodic_required(self):
         return self._is_periodic_required
 
+    def _search(self, xq):
+        # returns the same index as torch.bucketize(xq, self.x), but for
+        # monotonic queries the search starts from the index of the previous
+        # query point (or the index from the last call with the same shape)
+        if not _can_use_hinted_search(self._monotonic, xq, self.x):
+            return torch.bucketize(xq, self.x)
+        hint = self._last_idx
+        if hint is None or hint.shape != xq.shape:
+            hint = np.empty(0, dtype=np.int64)
+        # the index is stored as a numpy array, so it is not collected as a
+        # tensor of the object by EditableModule
+        idx = _cspline_numba.hinted_search(self.x.detach().numpy(), xq.detach().numpy(), hint)
+        self._last_idx = idx
+        return torch.from_numpy(idx)
+
+    def _locate(self, xq):
+        # returns the interval index of xq (see _search) and the mask of the
+        # extrapolated points, idx == 0 can only be an extrapolation if
+        # xq != xmin (which is also true for nan)
+        nr = self.x.shape[-1]
+        idx = self._search(xq) # (nrq)
+        xqextrap_mask = (idx == nr) | ((idx == 0) & (xq != self._xmin)) # (nrq)
+        return idx, xqextrap_mask
+
     def __call__(self, xq, y=None):
         # xq: (nrq)
         # y: (*BY, nr)
@@ -35,29 +68,50 @@ class BaseInterp1D(BaseInterp):
         elif self.is_periodic_required():
             check_periodic_value(y)
 
-        xqinterp_mask = torch.logical_and(xq >= self._xmin, xq <= self._xmax) # (nrq)
-        xqextrap_mask = ~xqinterp_mask
-        allinterp = torch.all(xqinterp_mask)
+        idx, xqextrap_mask = self._locate(xq) # (nrq)
+        xqinterp_mask = ~xqextrap_mask
+        allinterp = not torch.any(xqextrap_mask)
 
         if allinterp:
-            return self._interp(xq, y=y)
+            return self._interp(xq, y=y, idx=idx)
         elif extrap == "mirror" or extrap == "periodic" or extrap == "bound":
             # extrapolation by mapping it to the interpolated region
-            xq2 = xq.clone()
-            xq2[xqextrap_mask] = get_extrap_pos(xq[xqextrap_mask], extrap, self._xmin, self._xmax)
+            xq2 = torch.where(xqextrap_mask, get_extrap_pos(xq, extrap, self._xmin, self._xmax), xq)
             return self._interp(xq2, y=y)
+        elif hasattr(extrap, "__call__"):
+            # the extrapolation function is only applied on the extrapolated
+            # points, as it might not be defined inside, so the points are
+            # split with index tensors that are computed once and used for
+            # both gathering xq and assembling yq
+            interp_idx = xqinterp_mask.nonzero(as_tuple=True)[0] # (nrqinterp)
+            extrap_idx = xqextrap_mask.nonzero(as_tuple=True)[0] # (nrqextrap)
+            yqinterp = self._interp(xq.index_select(0, interp_idx), y=y,
+                                    idx=idx.index_select(0, interp_idx)) # (*BY, nrqinterp)
+            yqextrap = get_extrap_val(xq.index_select(0, extrap_idx), y, extrap) # (*BY, nrqextrap)
+            yq = yqinterp.new_empty((*yqinterp.shape[:-1], xq.shape[-1])) # (*BY, nrq)
+            return yq.index_copy(-1, interp_idx, yqinterp).index_copy(-1, extrap_idx, yqextrap)
         else:
-            # interpolation
-            yqinterp = self._interp(xq[xqinterp_mask], y=y) # (*BY, nrq)
-            yqextrap = get_extrap_val(xq[xqextrap_mask], y, extrap)
-
-            yq = torch.empty((*y.shape[:-1], xq.shape[-1]), dtype=y.dtype, device=y.device) # (*BY, nrq)
-            yq[...,xqinterp_mask] = yqinterp
-            yq[...,xqextrap_mask] = yqextrap
-            return yq
+            # interpolate on all points with the extrapolated points moved to
+            # xmin, so the values can be combined elementwise without scatter
+            xqinterp = torch.where(xqinterp_mask, xq, self._xmin) # (nrq)
+            idxinterp = torch.where(xqinterp_mask, idx, torch.zeros_like(idx))
+            yqinterp = self._interp(xqinterp, y=y, idx=idxinterp) # (*BY, nrq)
+            yqextrap = get_extrap_val(xq, y, extrap) # (*BY, nrq)
+            return torch.where(xqinterp_mask, yqinterp, yqextrap) # (*BY, nrq)
+
+    def interp_batch(self, xq, ys):
+        # xq: (nrq)
+        # ys: list of tensors with the same shape (*BY, nr)
+        # the y's are stacked so the solve and evaluation are done once
+        if self._y_is_given:
+            raise RuntimeError("interp_batch can only be used if y is not given during the initialization")
+        yqs = self(xq, torch.stack(ys, dim=0)) # (nys, *BY, nrq)
+        return list(torch.unbind(yqs, dim=0))
 
     @abstractmethod
-    def _interp(self, xq, y):
+    def _interp(self, xq, y, idx=None):
+        # idx is the interval index of xq from self._locate if it has been
+        # calculated, otherwise it is None
         pass
 
 class CubicSpline1D(BaseInterp1D):
@@ -95,13 +149,69 @@ class CubicSpline1D(BaseInterp1D):
 
         Default: ``None``
 
+    assume_sorted: bool
+        ``x`` must be sorted in a strictly ascending order.
+        If ``True``, it is assumed without checking.
+        If ``False``, ``x`` is checked and an error is raised if it is not
+        sorted.
+        Default: ``True``
+
+    monotonic: bool
+        If ``True``, the interval of every query point is searched by walking
+        from the interval of the previous query point, or from the interval
+        found in the last call if ``xq`` has the same shape.
+        For ascending ``xq``, this makes the search a single pass over ``x``
+        and ``xq``.
+        It is only used if numba is installed, for at least 1000 query points
+        on CPU with the same dtype as ``x``, and not for uniformly spaced
+        ``x`` where the interval is computed directly.
+        The results are the same as with ``False``.
+        Default: ``False``
+
+    precision: str or None
+        Precision to store the precomputed spline matrix and polynomial
+        coefficients for inference-only workloads:
+
+        * ``"bf16"``: stored in ``torch.bfloat16``
+        * ``"fp16"``: stored in ``torch.float16``
+        * ``"full"`` or ``None``: stored in the same precision as ``x`` and ``y``
+
+        The positions and the results are always calculated in the precision
+        of the inputs, but the interpolated values (including the values at
+        ``x``) are only accurate up to the storage precision.
+        If ``x`` or ``y`` requires gradient, it is always stored in the
+        precision of the inputs.
+        If ``y`` is given in ``__call__`` and requires gradient, the spline
+        matrix in the precision of the inputs is used.
+        With ``"bf16"`` or ``"fp16"``, ``float64`` inputs on CPU are evaluated
+        with torch operations instead of the numba kernel (see ``kernel``).
+        Default: ``None``
+
+    kernel: str or None
+        The kernel to evaluate the spline polynomials when no gradient is
+        required:
+
+        * ``None``: use the numba kernel (if numba is installed) for ``float64``
+          inputs on CPU with at least 10000 interpolated values, otherwise use
+          torch operations
+        * ``"numba"``: use the numba kernel for all ``float64`` inputs on CPU.
+          The first call compiles the kernel, which can take about a second
+          if it has not been cached.
+        * ``"triton"``: (experimental) use the triton kernel for ``float32``
+          and ``float64`` inputs on GPU, otherwise use torch operations.
+          Requires triton to be installed.
+        * ``"torch"``: always use torch operations
+
+        Default: ``None``
+
     References
     ----------
     .. [1] SplineInterpolation on Wikipedia,
            https://en.wikipedia.org/wiki/Spline_interpolation#Algorithm_to_find_the_interpolating_cubic_spline)
     .. [2] Carl de Boor, "A Practical Guide to Splines", Springer-Verlag, 1978.
     """
-    def __init__(self, x, y=None, bc_type=None, extrap=None, **unused):
+    def __init__(self, x, y=None, bc_type=None, extrap=None, assume_sorted=True,
+                 monotonic=False, precision=None, kernel=None, **unused):
         # x: (nr,)
         # y: (*BY, nr)
 
@@ -109,9 +219,9 @@ class CubicSpline1D(BaseInterp1D):
         if bc_type is None:
             bc_type = "natural"
         extrap = check_and_get_extrap(extrap, bc_type)
-        super(CubicSpline1D, self).__init__(x, y, extrap=extrap)
+        super(CubicSpline1D, self).__init__(x, y, extrap=extrap, assume_sorted=assume_sorted,
+                                            monotonic=monotonic)
 
-        self.x = x
         if x.ndim != 1:
             raise RuntimeError("The input x must be a 1D tensor")
 
@@ -121,84 +231,138 @@ class CubicSpline1D(BaseInterp1D):
         self.bc_type = bc_type
         self.set_periodic_required(extrap == "periodic") # or self.bc_type == "periodic"
 
+        kernels = [None, "numba", "triton", "torch"]
+        if kernel not in kernels:
+            raise RuntimeError("Unknown kernel %s. Available options: %s" % (kernel, kernels))
+        if kernel == "numba" and not _cspline_numba.numba_available:
+            raise RuntimeError("numba must be installed to use the numba kernel")
+        if kernel == "triton" and not _cspline_triton.triton_available:
+            raise RuntimeError("triton must be installed to use the triton kernel")
+        self._kernel = kernel
+
+        # check if x is uniformly spaced to get the segment index arithmetically
+        nr = x.shape[-1]
+        self._x0 = x[...,:1]
+        self._h = (x[...,-1:] - x[...,:1]) / (nr - 1)
+        xuniform = self._x0 + torch.arange(nr, dtype=x.dtype, device=x.device) * self._h
+        # only the rounding error of constructing x (e.g. from linspace) is
+        # tolerated, because a knot that is off by d makes the points within
+        # d of the knot evaluated with the neighbouring segment polynomial
+        tol = 4 * nr * torch.finfo(x.dtype).eps * torch.max(torch.abs(x))
+        self._uniform = bool(torch.all(torch.abs(x - xuniform) <= tol))
+
         # precompute the inverse of spline matrix
-        self.spline_mat_inv = _get_spline_mat_inv(x, bc_type) # (nr, nr)
+        spline_mat_inv = _get_spline_mat_inv(x, bc_type) # (nr, nr)
         self.y_is_given = y is not None
+        self._ks_cache = _KsCache()
         if self.y_is_given:
             if self.is_periodic_required():
                 check_periodic_value(y)
             self.y = y
-            self.ks = torch.matmul(self.spline_mat_inv, y.unsqueeze(-1)).squeeze(-1)
+            ks = torch.matmul(spline_mat_inv, y.unsqueeze(-1)).squeeze(-1)
 
-    def _interp(self, xq, y):
-        # https://en.wikipedia.org/wiki/Spline_interpolation#Algorithm_to_find_the_interpolating_cubic_spline
-        # get the k-vector (i.e. the gradient at every points)
-        if self.y_is_given:
-            ks = self.ks
+            # precompute the coefficients of the t-polynomial for every segment,
+            # so the spline matrix and ks are not needed anymore
+            self._xdx, self._pcoef = _get_poly_coeffs(x, y, ks)
         else:
-            ks = torch.matmul(self.spline_mat_inv, y.unsqueeze(-1)).squeeze(-1) # (*BY, nr)
-
+            self.spline_mat_inv = spline_mat_inv
+
+        # store the precomputed values in reduced precision if requested,
+        # the spline matrix is kept in full precision for the gradient
+        storage_dtype = _get_storage_dtype(precision, x, y)
+        self._mat_lowprec = None
+        if storage_dtype is not None:
+            if self.y_is_given:
+                self._pcoef = self._pcoef.to(storage_dtype)
+            else:
+                self._mat_lowprec = _LowPrecCopy(self.spline_mat_inv, storage_dtype)
+
+    def _interp(self, xq, y, idx=None):
+        # https://en.wikipedia.org/wiki/Spline_interpolation#Algorithm_to_find_the_interpolating_cubic_spline
         x = self.x # (nr)
 
         # find the index location of xq
         nr = x.shape[-1]
-        idxr = torch.searchsorted(x, xq, right=False) # (nrq)
-        idxr = torch.clamp(idxr, 1, nr-1)
+        if idx is None:
+            if self._uniform:
+                idx = self._get_uniform_idx(xq)
+            else:
+                idx = torch.bucketize(xq, x, right=False) # (nrq)
+        idxr = torch.clamp(idx, 1, nr-1)
         idxl = idxr - 1 # (nrq) from (0 to nr-2)
 
-        if torch.numel(xq) > torch.numel(x):
-            # get the variables needed
-            yl = y[...,:-1] # (*BY, nr-1)
-            xl = x[...,:-1] # (nr-1)
-            dy = y[...,1:] - yl # (*BY, nr-1)
-            dx = x[...,1:] - xl # (nr-1)
-            a = ks[...,:-1] * dx - dy # (*BY, nr-1)
-            b = -ks[...,1:] * dx + dy # (*BY, nr-1)
-
-            # calculate the coefficients for the t-polynomial
-            p0 = yl # (*BY, nr-1)
-            p1 = (dy + a) # (*BY, nr-1)
-            p2 = (b - 2*a) # (*BY, nr-1)
-            p3 = a - b # (*BY, nr-1)
-
-            t = (xq - torch.gather(xl, -1, idxl)) / torch.gather(dx, -1, idxl) # (nrq)
-            # yq = p0[:,idxl] + t * (p1[:,idxl] + t * (p2[:,idxl] + t * p3[:,idxl])) # (nbatch, nrq)
-            # NOTE: lines below do not work if xq and x have batch dimensions
-            yq = p3[...,idxl] * t
-            yq += p2[...,idxl]
-            yq *= t
-            yq += p1[...,idxl]
-            yq *= t
-            yq += p0[...,idxl]
-            return yq
+        if self.y_is_given:
+            # the coefficients are already precomputed during the initialization
+            xdx, pcoef = self._xdx, self._pcoef
 
         else:
-            xl = torch.gather(x, -1, idxl)
-            xr = torch.gather(x, -1, idxr)
-            yl = y[...,idxl].contiguous()
-            yr = y[...,idxr].contiguous()
-            kl = ks[...,idxl].contiguous()
-            kr = ks[...,idxr].contiguous()
-
-            dxrl = xr - xl # (nrq,)
-            dyrl = yr - yl # (nbatch, nrq)
-
-            # calculate the coefficients of the large matrices
-            t = (xq - xl) / dxrl # (nrq,)
-            tinv = 1 - t # nrq
-            tta = t*tinv*tinv
-            ttb = t*tinv*t
-            tyl = tinv + tta - ttb
-            tyr = t - tta + ttb
-            tkl = tta * dxrl
-            tkr = -ttb * dxrl
-
-            yq = yl*tyl + yr*tyr + kl*tkl + kr*tkr
-            return yq
+            # get the k-vector (i.e. the gradient at every points)
+            ks = self._get_ks(y) # (*BY, nr)
+
+            if torch.numel(xq) > torch.numel(x):
+                xdx, pcoef = _get_poly_coeffs(x, y, ks)
+
+            else:
+                xl = torch.gather(x, -1, idxl)
+                xr = torch.gather(x, -1, idxr)
+                yl = y[...,idxl] # (*BY, nrq)
+                yr = y[...,idxr]
+                kl = ks[...,idxl]
+                kr = ks[...,idxr]
+
+                dxrl = xr - xl # (nrq,)
+                t = (xq - xl) / dxrl # (nrq,)
+                yq = _short_eval(t, yl, yr, kl, kr, dxrl) # (*BY, nrq)
+                return yq
+
+        if _can_use_numba(self._kernel, xq, xdx, pcoef):
+            return _cspline_eval_numba(idxl, xdx, pcoef, xq)
+        if _can_use_triton(self._kernel, xq, xdx, pcoef):
+            return _cspline_triton.cspline_eval(idxl, xdx, pcoef, xq)
+
+        # use the analytical backward if the gradients are needed, so the
+        # intermediate tensors of the evaluation are not kept in the graph
+        if torch.is_grad_enabled() and any([t.requires_grad for t in (xq, xdx, pcoef)]):
+            return _CSplineEval.apply(xq, idxl, xdx, pcoef)
+        return _cspline_eval_torch(xq, idxl, xdx, pcoef)
+
+    def _locate(self, xq):
+        # for uniform x, the bucketize search of BaseInterp1D._locate is not
+        # used at all and the index is obtained arithmetically from xq
+        if not self._uniform:
+            return super(CubicSpline1D, self)._locate(xq)
+        idx = self._get_uniform_idx(xq)
+        xqextrap_mask = ~torch.logical_and(xq >= self._xmin, xq <= self._xmax) # (nrq)
+        return idx, xqextrap_mask
+
+    def _get_uniform_idx(self, xq):
+        # for uniform x, the interval index can be obtained without search and
+        # the clamp also takes care of the extrapolated points
+        nr = self.x.shape[-1]
+        idxl = ((xq - self._x0) / self._h).long().clamp_(0, nr-2) # (nrq)
+        return idxl + 1
+
+    def _get_ks(self, y):
+        # returns the k-vector of y given in __call__, reusing the one from the
+        # previous call if it is the same y that has not been modified.
+        # It is only cached when no gradient is needed, otherwise the graph
+        # of ks would be shared by different calls
+        mat = self.spline_mat_inv
+        nograd = not (torch.is_grad_enabled() and (y.requires_grad or mat.requires_grad))
+        if nograd and self._mat_lowprec is not None:
+            # the matrix multiplication is done in the storage precision if
+            # no gradient is needed
+            mat = self._mat_lowprec.get(mat)
+        if nograd and self._ks_cache.match(y, mat):
+            return self._ks_cache.ks
+        ks = torch.matmul(mat, y.to(mat.dtype).unsqueeze(-1)).squeeze(-1).to(y.dtype) # (*BY, nr)
+        if nograd:
+            self._ks_cache.set(y, mat, ks)
+        return ks
 
     def getparamnames(self):
         if self.y_is_given:
-            res = ["x", "y", "ks"]
+            res = ["_xdx", "_pcoef"]
         else:
             res = ["spline_mat_inv", "x"]
         return res
@@ -215,17 +379,344 @@ def check_periodic_value(y):
     if not torch.allclose(y[...,0], y[...,-1]):
         raise RuntimeError("The value of y must be periodic to have periodic bc_type or extrap")
 
-# @torch.jit.script
+class _KsCache(object):
+    # single-entry cache of the k-vector for a given y and spline matrix.
+    # __slots__ is used so the cached tensors are not collected as the
+    # tensor parameters of the object by EditableModule
+    __slots__ = ["y_ref", "y_version", "y_ptr", "mat", "ks"]
+
+    def __init__(self):
+        self.y_ref = None
+        self.y_version = None
+        self.y_ptr = None
+        self.mat = None
+        self.ks = None
+
+    def match(self, y, mat):
+        # y is compared by identity and invalidated by in-place modification
+        return self.y_ref is not None and self.y_ref() is y and \
+            self.y_version == y._version and self.y_ptr == y.data_ptr() and \
+            self.mat is mat
+
+    def set(self, y, mat, ks):
+        self.y_ref = weakref.ref(y)
+        self.y_version = y._version
+        self.y_ptr = y.data_ptr()
+        self.mat = mat
+        self.ks = ks
+
+class _LowPrecCopy(object):
+    # reduced precision copy of a tensor that is only used as long as the
+    # source tensor has not been replaced (e.g. by EditableModule.setparams).
+    # __slots__ is used so the copy is not collected as the tensor parameters
+    # of the object by EditableModule
+    __slots__ = ["src", "val"]
+
+    def __init__(self, src, dtype):
+        self.src = src
+        self.val = src.to(dtype)
+
+    def get(self, src):
+        return self.val if src is self.src else src
+
+def _get_storage_dtype(precision, *tensors):
+    # returns the dtype to store the precomputed values or None if it should
+    # follow the dtype of the inputs
+    if precision is None:
+        return None
+    dtypes = {
+        "bf16": torch.bfloat16,
+        "fp16": torch.float16,
+        "full": None,
+    }
+    if precision not in dtypes:
+        raise RuntimeError("Unknown precision %s. Available options: %s" % (precision, list(dtypes.keys())))
+
+    # reduced precision is only for inference
+    if any([t is not None and t.requires_grad for t in tensors]):
+        return None
+    return dtypes[precision]
+
+# the minimum number of query points to use the hinted search, below it the
+# call overhead makes it slower than bucketize
+_HINTED_SEARCH_MIN_NRQ = 1000
+
+def _can_use_hinted_search(monotonic, xq, x):
+    if not monotonic or not _cspline_numba.numba_available:
+        return False
+    if xq.ndim != 1 or xq.shape[-1] < _HINTED_SEARCH_MIN_NRQ:
+        return False
+    return xq.dtype == x.dtype and xq.dtype in [torch.float32, torch.float64] and \
+        xq.device.type == "cpu" and x.device.type == "cpu"
+
+# the minimum number of interpolated values to use the numba kernel by default
+_NUMBA_MIN_NUMEL = 10000
+
+def _can_use_numba(kernel, xq, xdx, pcoef):
+    # the numba kernel is only for float64 tensors on CPU that do not
+    # need to propagate the gradients.
+    # By default, it is only used for large evaluations, so small ones do not
+    # pay the time to import numba and compile the kernel
+    if kernel not in [None, "numba"] or not _cspline_numba.numba_available:
+        return False
+    nbatch = pcoef.numel() // (pcoef.shape[-2] * 4)
+    if kernel is None and nbatch * xq.shape[-1] < _NUMBA_MIN_NUMEL:
+        return False
+    tensors = (xq, xdx, pcoef)
+    if torch.is_grad_enabled() and any([t.requires_grad for t in tensors]):
+        return False
+    return all([t.device.type == "cpu" and t.dtype == torch.float64 for t in tensors])
+
+def _can_use_triton(kernel, xq, xdx, pcoef):
+    # the triton kernel is only used if it is chosen explicitly and only for
+    # float tensors with the same dtype on GPU that do not need to propagate
+    # the gradients.
+    # triton is only imported by the first call of the kernel, i.e. after
+    # xq is known to be on GPU
+    if kernel != "triton" or not xq.is_cuda:
+        return False
+    tensors = (xq, xdx, pcoef)
+    if torch.is_grad_enabled() and any([t.requires_grad for t in tensors]):
+        return False
+    dtype = tensors[0].dtype
+    return dtype in [torch.float32, torch.float64] and \
+        all([t.is_cuda and t.dtype == dtype for t in tensors])
+
+def _cspline_eval_numba(idxl, xdx, pcoef, xq):
+    # evaluate the polynomial with the numba kernel
+    # xdx: (nr-1, 2)
+    # pcoef: (*BY, nr-1, 4)
+    # returns yq: (*BY, nrq)
+    batch_shape = pcoef.shape[:-2]
+    nseg = pcoef.shape[-2]
+    to_numpy = lambda t: t.detach().contiguous().numpy()
+    yq = _cspline_numba.cspline_eval(to_numpy(idxl), to_numpy(xdx),
+                                     to_numpy(pcoef.reshape(-1, nseg, 4)), to_numpy(xq))
+    return torch.from_numpy(yq).reshape(*batch_shape, xq.shape[-1])
+
+def _cspline_eval_torch(xq, idxl, xdx, pcoef):
+    # evaluate the polynomial with torch operations
+    # xq, idxl: (nrq,)
+    # xdx: (nr-1, 2)
+    # pcoef: (*BY, nr-1, 4)
+    # returns yq: (*BY, nrq)
+
+    # gather all the values of a segment at once
+    xl, dx = xdx.index_select(-2, idxl).unbind(-1) # (nrq)
+    t = (xq - xl) / dx # (nrq)
+    # yq = p0[:,idxl] + t * (p1[:,idxl] + t * (p2[:,idxl] + t * p3[:,idxl])) # (nbatch, nrq)
+    # NOTE: lines below do not work if xq and x have batch dimensions
+    # the coefficients might be stored in lower precision
+    gcoef = pcoef.index_select(-2, idxl).to(t.dtype) # (*BY, nrq, 4)
+    g0, g1, g2, g3 = gcoef.unbind(-1) # (*BY, nrq)
+    yq = torch.addcmul(g2, g3, t)
+    yq = torch.addcmul(g1, yq, t)
+    yq = torch.addcmul(g0, yq, t)
+    return yq
+
+class _CSplineEval(torch.autograd.Function):
+    # evaluate the polynomial with the closed-form backward, i.e. the
+    # derivative w.r.t. t is a quadratic of t and the derivative w.r.t. the
+    # coefficients are the powers of t.
+    # The backward is written with differentiable operations of the saved
+    # inputs, so it can be differentiated again (e.g. for gradgradcheck)
+
+    @staticmethod
+    def forward(ctx, xq, idxl, xdx, pcoef):
+        ctx.save_for_backward(xq, idxl, xdx, pcoef)
+        return _cspline_eval_torch(xq, idxl, xdx, pcoef)
+
+    @staticmethod
+    def backward(ctx, grad_yq):
+        xq, idxl, xdx, pcoef = ctx.saved_tensors
+        nrq = xq.shape[-1]
+        xl, dx = xdx.index_select(-2, idxl).unbind(-1) # (nrq)
+        t = (xq - xl) / dx # (nrq)
+
+        grad_xq = grad_xdx = grad_pcoef = None
+        if ctx.needs_input_grad[0] or ctx.needs_input_grad[2]:
+            gcoef = pcoef.index_select(-2, idxl).to(t.dtype) # (*BY, nrq, 4)
+            _, g1, g2, g3 = gcoef.unbind(-1) # (*BY, nrq)
+            dydt = g1 + t * (2 * g2 + 3 * t * g3) # (*BY, nrq)
+            # xq is shared by all the batch dimensions of y
+            grad_t = (grad_yq * dydt).reshape(-1, nrq).sum(dim=0) # (nrq)
+            grad_xq = grad_t / dx
+            if ctx.needs_input_grad[2]:
+                # dt/dxl = -1/dx and dt/ddx = -t/dx
+                grad_seg = torch.stack((-grad_xq, -grad_xq * t), dim=-1) # (nrq, 2)
+                grad_xdx = torch.zeros_like(xdx).index_add(0, idxl, grad_seg)
+            if not ctx.needs_input_grad[0]:
+                grad_xq = None
+
+        if ctx.needs_input_grad[3]:
+            tpow = torch.stack((torch.ones_like(t), t, t * t, t * t * t), dim=-1) # (nrq, 4)
+            grad_gcoef = grad_yq.unsqueeze(-1) * tpow # (*BY, nrq, 4)
+            grad_pcoef = torch.zeros(pcoef.shape, dtype=grad_gcoef.dtype, device=pcoef.device)
+            grad_pcoef = grad_pcoef.index_add(pcoef.ndim - 2, idxl, grad_gcoef).to(pcoef.dtype)
+
+        return grad_xq, None, grad_xdx, grad_pcoef
+
+def _short_eval(t, yl, yr, kl, kr, dxrl):
+    # evaluate the cubic spline from the values and gradients at both ends
+    # of the segments.
+    # It is not scripted with torch.jit.script, which is deprecated (it warns
+    # on every import) and is slower than eager mode on CPU
+    # t, dxrl: (nrq,)
+    # yl, yr, kl, kr: (*BY, nrq)
+    tinv = 1 - t
+    tta = t * tinv * tinv
+    ttb = t * tinv * t
+    return yl * (tinv + tta - ttb) + yr * (t - tta + ttb) + (kl * tta - kr * ttb) * dxrl
+
+def _get_poly_coeffs(x:torch.Tensor, y:torch.Tensor, ks:torch.Tensor):
+    """
+    Returns the position and width of every segment as well as the coefficients
+    of the polynomial in every segment, where the value in the i-th segment is
+    given by
+
+    >>> xl, dx = xdx[i]
+    >>> p0, p1, p2, p3 = pcoef[...,i,:].unbind(-1)
+    >>> t = (xq - xl) / dx
+    >>> yq = p0 + t * (p1 + t * (p2 + t * p3))
+
+    The values of every segment are stacked in the last dimension, so all of
+    them can be obtained in a single gather.
+
+    Arguments
+    ---------
+    x: torch.Tensor with shape (nr,)
+        The x-position of the data
+    y: torch.Tensor with shape (*BY, nr)
+        The values of the data
+    ks: torch.Tensor with shape (*BY, nr)
+        The gradients at every point of the data
+
+    Returns
+    -------
+    xdx: torch.Tensor with shape (nr-1, 2)
+        The left position and the width of every segment
+    pcoef: torch.Tensor with shape (*BY, nr-1, 4)
+        The coefficients of the t-polynomial in every segment
+    """
+    # get the variables needed
+    yl = y[...,:-1] # (*BY, nr-1)
+    xl = x[...,:-1] # (nr-1)
+    dy = y[...,1:] - yl # (*BY, nr-1)
+    dx = x[...,1:] - xl # (nr-1)
+    a = ks[...,:-1] * dx - dy # (*BY, nr-1)
+    b = -ks[...,1:] * dx + dy # (*BY, nr-1)
+
+    # calculate the coefficients for the t-polynomial
+    p0 = yl # (*BY, nr-1)
+    p1 = (dy + a) # (*BY, nr-1)
+    p2 = (b - 2*a) # (*BY, nr-1)
+    p3 = a - b # (*BY, nr-1)
+
+    xdx = torch.stack((xl, dx), dim=-1) # (nr-1, 2)
+    pcoef = torch.stack((p0, p1, p2, p3), dim=-1) # (*BY, nr-1, 4)
+    return xdx, pcoef
+
+# the minimum number of points to use the cyclic reduction instead of the
+# dense solver to get the spline matrix inverse
+_TRIDIAG_SOLVE_MIN_NR = 512
+
+def _solve_tridiag(subdiag:torch.Tensor, diag:torch.Tensor, supdiag:torch.Tensor,
+                   rhs:torch.Tensor):
+    """
+    Solve the tridiagonal linear equation ``T @ X = rhs`` using the cyclic
+    reduction [1]_, where ``T`` is a tridiagonal matrix described by its
+    3 diagonals.
+    Every reduction step eliminates half of the unknowns for all rows at once,
+    so it only takes ``O(log(nr))`` steps.
+    No pivoting is done, so ``T`` should be diagonally dominant.
+
+    Arguments
+    ---------
+    subdiag: torch.Tensor with shape (*BX, nr-1)
+        The lower diagonal of the matrix, i.e. ``T[...,i+1,i]``
+    diag: torch.Tensor with shape (*BX, nr)
+        The main diagonal of the matrix, i.e. ``T[...,i,i]``
+    supdiag: torch.Tensor with shape (*BX, nr-1)
+        The upper diagonal of the matrix, i.e. ``T[...,i,i+1]``
+    rhs: torch.Tensor with shape (*BX, nr, ncols)
+        The right hand side of the equation
+
+    Returns
+    -------
+    X: torch.Tensor with shape (*BX, nr, ncols)
+        The solution of the equation.
+
+    References
+    ----------
+    .. [1] Cyclic reduction on Wikipedia,
+           https://en.wikipedia.org/wiki/Cyclic_reduction
+    """
+    # the operations are done out-of-place to keep it differentiable
+    nr = diag.shape[-1]
+
+    # a: coefficient of x[i-1] in the i-th row, c: coefficient of x[i+1]
+    zero_pad = torch.zeros_like(diag[...,:1])
+    a = torch.cat([zero_pad, subdiag], dim=-1) # (*BX, nr)
+    b = diag
+    c = torch.cat([supdiag, zero_pad], dim=-1)
+    d = rhs # (*BX, nr, ncols)
+
+    # pad with identity rows to have 2^k - 1 rows, so every reduced row
+    # always has both neighbours
+    n = 1
+    while n < nr:
+        n = 2 * n + 1
+    if n > nr:
+        pad = zero_pad.expand(*zero_pad.shape[:-1], n - nr)
+        a = torch.cat([a, pad], dim=-1)
+        b = torch.cat([b, pad + 1], dim=-1)
+        c = torch.cat([c, pad], dim=-1)
+        dpad = torch.zeros_like(d[...,:1,:]).expand(*d.shape[:-2], n - nr, d.shape[-1])
+        d = torch.cat([d, dpad], dim=-2)
+
+    # reduction: eliminate the even rows from the odd rows
+    systems = []
+    while b.shape[-1] > 1:
+        systems.append((a, b, c, d))
+        alpha = -a[...,1::2] / b[...,:-1:2] # (*BX, m)
+        gamma = -c[...,1::2] / b[...,2::2]
+        d = d[...,1::2,:] + alpha.unsqueeze(-1) * d[...,:-1:2,:] + \
+            gamma.unsqueeze(-1) * d[...,2::2,:]
+        b = b[...,1::2] + alpha * c[...,:-1:2] + gamma * a[...,2::2]
+        a = alpha * a[...,:-1:2]
+        c = gamma * c[...,2::2]
+    xs = d / b.unsqueeze(-1) # (*BX, 1, ncols)
+
+    # back substitution: get the even rows from the odd rows solution
+    for a, b, c, d in systems[::-1]:
+        zero_row = torch.zeros_like(xs[...,:1,:])
+        xpad = torch.cat([zero_row, xs, zero_row], dim=-2)
+        xeven = (d[...,::2,:] - a[...,::2].unsqueeze(-1) * xpad[...,:-1,:] -
+                 c[...,::2].unsqueeze(-1) * xpad[...,1:,:]) / b[...,::2].unsqueeze(-1)
+        # interleave the even and odd rows
+        xs = torch.stack((xeven[...,:-1,:], xs), dim=-2).flatten(-3, -2)
+        xs = torch.cat([xs, xeven[...,-1:,:]], dim=-2)
+    return xs[...,:nr,:]
+
+def _solve_dense(mat:torch.Tensor, rhs:torch.Tensor):
+    # solve mat @ X = rhs with the dense LU solver of the torch version
+    if hasattr(torch, "linalg") and hasattr(torch.linalg, "solve"):
+        return torch.linalg.solve(mat, rhs)
+    return torch.solve(rhs, mat)[0]
+
 def _get_spline_mat_inv(x:torch.Tensor, bc_type:str):
     """
     Returns the inverse of spline matrix where the gradient can be obtained just
     by
 
-    >>> spline_mat_inv = _get_spline_mat_inv(x, transpose=True)
-    >>> ks = torch.matmul(y, spline_mat_inv)
+    >>> spline_mat_inv = _get_spline_mat_inv(x, bc_type)
+    >>> ks = torch.matmul(spline_mat_inv, y.unsqueeze(-1)).squeeze(-1)
 
     where `y` is a tensor of (nbatch, nr) and `spline_mat_inv` is the output of
-    this function with shape (nr, nr)
+    this function with shape (nr, nr).
+    The spline matrix is tridiagonal, so for large ``nr`` it is solved with the
+    cyclic reduction (see ``_solve_tridiag``), while the dense LU solver is
+    used for small ``nr`` as it needs fewer operations to be launched.
 
     Arguments
     ---------
@@ -239,50 +730,45 @@ def _get_spline_mat_inv(x:torch.Tensor, bc_type:str):
     mat: torch.Tensor with shape (*BX, nr, nr)
         The inverse of spline matrix.
     """
-    nr = x.shape[-1]
-    BX = x.shape[:-1]
-    matshape = (*BX, nr, nr)
-
-    device = x.device
-    dtype = x.dtype
-
-    # construct the matrix for the left hand side
-    dxinv0 = 1./(x[...,1:] - x[...,:-1]) # (*BX,nr-1)
+    # construct the diagonals of the tridiagonal matrix on the left hand side
+    dxinv0 = torch.reciprocal(x[...,1:] - x[...,:-1]) # (*BX,nr-1)
     zero_pad = torch.zeros_like(dxinv0[...,:1])
-    dxinv = torch.cat((zero_pad, dxinv0, zero_pad), dim=-1)
+    dxinv = torch.cat([zero_pad, dxinv0, zero_pad], dim=-1)
     diag = (dxinv[...,:-1] + dxinv[...,1:]) * 2 # (*BX,nr)
-    offdiag = dxinv0 # (*BX,nr-1)
-    spline_mat = torch.zeros(matshape, dtype=dtype, device=device)
-    spdiag = spline_mat.diagonal(dim1=-2, dim2=-1) # (*BX, nr)
-    spudiag = spline_mat.diagonal(offset=1, dim1=-2, dim2=-1)
-    spldiag = spline_mat.diagonal(offset=-1, dim1=-2, dim2=-1)
-    spdiag[...,:] = diag
-    spudiag[...,:] = offdiag
-    spldiag[...,:] = offdiag
-
-    # construct the matrix on the right hand side
+    subdiag = dxinv0 # (*BX,nr-1)
+    supdiag = dxinv0 # (*BX,nr-1)
+
+    # the diagonals of the matrix on the right hand side
     dxinv2 = (dxinv * dxinv) * 3
     diagr = (dxinv2[...,:-1] - dxinv2[...,1:])
     udiagr = dxinv2[...,1:-1]
     ldiagr = -udiagr
-    matr = torch.zeros(matshape, dtype=dtype, device=device)
-    matrdiag = matr.diagonal(dim1=-2, dim2=-1)
-    matrudiag = matr.diagonal(offset=1, dim1=-2, dim2=-1)
-    matrldiag = matr.diagonal(offset=-1, dim1=-2, dim2=-1)
-    matrdiag[...,:] = diagr
-    matrudiag[...,:] = udiagr
-    matrldiag[...,:] = ldiagr
 
     if bc_type == "clamped":
-        spline_mat[...,0,:] = 0.
-        spline_mat[...,0,0] = 1.
-        spline_mat[...,-1,:] = 0.
-        spline_mat[...,-1,-1] = 1.
-        matr[...,0,:] = 0.
-        matr[...,-1,:] = 0.
-
-    # solve the matrix inverse
-    spline_mat_inv, _ = torch.solve(matr, spline_mat)
+        # replace the first and last rows of both matrices, so the first and
+        # last gradients are 0, by patching the diagonals before the matrix
+        # is constructed
+        one_pad = torch.ones_like(zero_pad)
+        diag = torch.cat([one_pad, diag[...,1:-1], one_pad], dim=-1)
+        supdiag = torch.cat([zero_pad, supdiag[...,1:]], dim=-1)
+        subdiag = torch.cat([subdiag[...,:-1], zero_pad], dim=-1)
+        diagr = torch.cat([zero_pad, diagr[...,1:-1], zero_pad], dim=-1)
+        udiagr = torch.cat([zero_pad, udiagr[...,1:]], dim=-1)
+        ldiagr = torch.cat([ldiagr[...,:-1], zero_pad], dim=-1)
+
+    matr = torch.diag_embed(diagr) + \
+           torch.diag_embed(udiagr, offset=1) + \
+           torch.diag_embed(ldiagr, offset=-1) # (*BX, nr, nr)
+
+    # solve the tridiagonal system for all the columns of matr at once
+    nr = x.shape[-1]
+    if nr < _TRIDIAG_SOLVE_MIN_NR:
+        spline_mat = torch.diag_embed(diag) + \
+                     torch.diag_embed(supdiag, offset=1) + \
+                     torch.diag_embed(subdiag, offset=-1) # (*BX, nr, nr)
+        spline_mat_inv = _solve_dense(spline_mat, matr)
+    else:
+        spline_mat_inv = _solve_tridiag(subdiag, diag, supdiag, matr)
 
     # return to the shape of x
     return spline_mat_inv
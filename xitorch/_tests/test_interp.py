@@ -1,8 +1,13 @@
 import warnings
+import pytest
 import torch
 from torch.autograd import gradcheck, gradgradcheck
 from xitorch.interpolate.interp1 import Interp1D
 from xitorch._tests.utils import device_dtype_float_test
+from xitorch._impls.interpolate import interp_1d
+from xitorch._impls.interpolate.interp_1d import _CSplineEval, _cspline_eval_torch, \
+    _solve_tridiag, _cspline_eval_numba
+from xitorch._impls.interpolate import _cspline_numba, _cspline_triton
 
 @device_dtype_float_test(only64=True)
 def test_interp1_cspline(dtype, device):
@@ -124,5 +129,255 @@ def test_extrap(dtype, device):
         yq = interp(x, y1, xq1, extrap=extrap)
         assert torch.allclose(yq, yq_true, equal_nan=True)
 
+@device_dtype_float_test(only64=True)
+def test_interp1_extrap_callable(dtype, device):
+    dtype_device_kwargs = {"dtype": dtype, "device": device}
+    x = torch.tensor([0.0, 0.2, 0.3, 0.5, 0.8, 1.0], **dtype_device_kwargs)
+    y = torch.tensor([1.0, 1.5, 2.1, 1.1, 2.3, 2.5], **dtype_device_kwargs)
+    xq = torch.tensor([0.0, 0.5, 2.0], **dtype_device_kwargs).requires_grad_()
+
+    # the extrapolation function must only receive the extrapolated points
+    xqextraps = []
+    def extrap(xqextrap):
+        xqextraps.append(xqextrap)
+        return 1.0 / xqextrap
+    yq = Interp1D(x, y, method="cspline", extrap=extrap)(xq)
+    assert len(xqextraps) == 1
+    assert torch.allclose(xqextraps[0], xq[2:])
+    assert torch.allclose(yq[2:], 1.0 / xq[2:])
+    assert torch.allclose(yq[:2], Interp1D(x, y, method="cspline")(xq[:2]))
+
+    # the extrapolation function should not affect the gradient inside
+    dyq = torch.autograd.grad(yq.sum(), xq)[0]
+    assert torch.all(torch.isfinite(dyq))
+
+@device_dtype_float_test(only64=True)
+def test_interp1_unsorted(dtype, device):
+    dtype_device_kwargs = {"dtype": dtype, "device": device}
+    x = torch.tensor([0.0, 0.3, 0.2, 0.5, 0.8, 1.0], **dtype_device_kwargs)
+    y = torch.tensor([1.0, 1.5, 2.1, 1.1, 2.3, 2.5], **dtype_device_kwargs)
+    Interp1D(x[torch.argsort(x)], y, method="cspline", assume_sorted=False)
+    with pytest.raises(RuntimeError):
+        Interp1D(x, y, method="cspline", assume_sorted=False)
+
+@device_dtype_float_test(only64=True)
+def test_interp1_ks_cache(dtype, device):
+    dtype_device_kwargs = {"dtype": dtype, "device": device}
+    x = torch.tensor([0.0, 0.2, 0.3, 0.5, 0.8, 1.0], **dtype_device_kwargs)
+    y = torch.tensor([[1.0, 1.5, 2.1, 1.1, 2.3, 2.5],
+                      [0.8, 1.2, 2.2, 0.4, 3.2, 1.2]], **dtype_device_kwargs)
+    xq = torch.linspace(0, 1, 10, **dtype_device_kwargs)
+    interp = Interp1D(x, method="cspline")
+
+    # the k-vector is reused for the same y
+    yq0 = interp(xq, y)
+    ks0 = interp.obj._ks_cache.ks
+    assert ks0 is not None
+    interp(xq, y)
+    assert interp.obj._ks_cache.ks is ks0
+
+    # and it is recalculated if y is modified in-place or is a different tensor
+    y.mul_(2)
+    yq1 = interp(xq, y)
+    assert interp.obj._ks_cache.ks is not ks0
+    assert torch.allclose(yq1, 2 * yq0)
+    yq2 = interp(xq, y.clone() * 0.5)
+    assert torch.allclose(yq2, yq0)
+
+@device_dtype_float_test(only64=True)
+def test_interp1_precision(dtype, device):
+    dtype_device_kwargs = {"dtype": dtype, "device": device}
+    x = torch.tensor([0.0, 0.2, 0.3, 0.5, 0.8, 1.0], **dtype_device_kwargs)
+    y = torch.tensor([[1.0, 1.5, 2.1, 1.1, 2.3, 2.5],
+                      [0.8, 1.2, 2.2, 0.4, 3.2, 1.2]], **dtype_device_kwargs)
+    # include the knots
+    xq = torch.cat((torch.linspace(0, 1, 10, **dtype_device_kwargs), x))
+    yq_true = Interp1D(x, y, method="cspline")(xq)
+
+    assert torch.allclose(Interp1D(x, y, method="cspline", precision="full")(xq), yq_true)
+    with pytest.raises(RuntimeError):
+        Interp1D(x, y, method="cspline", precision="fp64")
+    for precision, rtol in [("bf16", 2e-2), ("fp16", 2e-3)]:
+        # the values are only accurate up to the storage precision relative
+        # to the magnitude of the polynomial coefficients
+        atol = rtol * y.abs().max().item()
+        yq1 = Interp1D(x, y, method="cspline", precision=precision)(xq)
+        yq2 = Interp1D(x, method="cspline", precision=precision)(xq, y)
+        assert yq1.dtype == dtype
+        assert yq2.dtype == dtype
+        assert torch.allclose(yq1, yq_true, rtol=rtol, atol=atol)
+        assert torch.allclose(yq2, yq_true, rtol=rtol, atol=atol)
+
+        # the gradient must be calculated in full precision
+        y2 = y.clone().requires_grad_()
+        yq3 = Interp1D(x, method="cspline", precision=precision)(xq, y2)
+        yq4 = Interp1D(x, method="cspline")(xq, y2)
+        assert torch.allclose(yq3, yq4)
+        gy3, = torch.autograd.grad(yq3.sum(), y2)
+        gy4, = torch.autograd.grad(yq4.sum(), y2)
+        assert torch.allclose(gy3, gy4)
+
+@pytest.mark.skipif(not _cspline_numba.numba_available, reason="numba is not installed")
+def test_interp1_monotonic():
+    dtype_device_kwargs = {"dtype": torch.float64}
+    torch.manual_seed(123)
+    x = torch.sort(torch.rand(50, **dtype_device_kwargs))[0]
+    y = torch.rand((2, 50), **dtype_device_kwargs)
+    xq0 = torch.linspace(-0.1, 1.1, 2000, **dtype_device_kwargs)
+
+    # the results with the hinted search must be the same as without it for
+    # sorted, shifted, and unsorted query points
+    interp0 = Interp1D(x, y, method="cspline", extrap="bound")
+    interp1 = Interp1D(x, y, method="cspline", extrap="bound", monotonic=True)
+    search1 = interp_1d.CubicSpline1D(x, y, extrap="bound", monotonic=True)._search
+    xq0[1000] = float("nan")
+    xqs = [xq0 + shift for shift in [0.0, 0.001, 0.05, -0.3]] + \
+        [xq0[torch.randperm(xq0.shape[0])], xq0[:10]]
+    for xq in xqs:
+        assert torch.equal(search1(xq), torch.bucketize(xq, x))
+        assert torch.allclose(interp0(xq), interp1(xq), equal_nan=True)
+
+@device_dtype_float_test(only64=True)
+def test_interp1_uniform(dtype, device):
+    dtype_device_kwargs = {"dtype": dtype, "device": device}
+    x = torch.linspace(0, 1, 6, **dtype_device_kwargs)
+    y = torch.tensor([[1.0, 1.5, 2.1, 1.1, 2.3, 2.5],
+                      [0.8, 1.2, 2.2, 0.4, 3.2, 1.2]], **dtype_device_kwargs)
+    # include the knots and the extrapolated points
+    xq = torch.cat((torch.linspace(-0.5, 1.5, 21, **dtype_device_kwargs), x))
+
+    # the uniform specialization must give the same results as the search
+    for extrap in ["nan", "mirror"]:
+        interp = Interp1D(x, y, method="cspline", extrap=extrap)
+        assert interp.obj._uniform
+        yq_uniform = interp(xq)
+        interp.obj._uniform = False
+        yq_search = interp(xq)
+        assert torch.allclose(yq_uniform, yq_search, equal_nan=True)
+
+    # x from a shifted linspace is still uniform up to the rounding error,
+    # but a knot moved by a small fraction of the segment width is not
+    assert Interp1D(x + 100.0, y, method="cspline").obj._uniform
+    x2 = x.clone()
+    x2[2] = x2[2] + 1e-6 * (x[1] - x[0])
+    assert not Interp1D(x2, y, method="cspline").obj._uniform
+
+@device_dtype_float_test(only64=True)
+def test_interp1_batch(dtype, device):
+    dtype_device_kwargs = {"dtype": dtype, "device": device}
+    x = torch.tensor([0.0, 0.2, 0.3, 0.5, 0.8, 1.0], **dtype_device_kwargs).requires_grad_()
+    ys = [torch.rand((2, 6), **dtype_device_kwargs).requires_grad_() for _ in range(3)]
+    xq = torch.linspace(0, 1, 10, **dtype_device_kwargs)
+
+    interp = Interp1D(x, method="cspline")
+    yqs = interp.interp_batch(xq, ys)
+    assert len(yqs) == len(ys)
+    for y, yq in zip(ys, yqs):
+        assert torch.allclose(yq, interp(xq, y))
+
+@device_dtype_float_test(only64=True)
+def test_interp1_cspline_backward(dtype, device):
+    dtype_device_kwargs = {"dtype": dtype, "device": device}
+    xdx = torch.rand((5, 2), **dtype_device_kwargs) + 0.5
+    pcoef = torch.rand((2, 5, 4), **dtype_device_kwargs).requires_grad_()
+    xq = torch.rand((7,), **dtype_device_kwargs) + 0.5
+    idxl = torch.tensor([0, 1, 1, 2, 4, 3, 0], dtype=torch.long, device=device)
+    xdx = xdx.requires_grad_()
+    xq = xq.requires_grad_()
+    params = (xq, xdx, pcoef)
+
+    # the analytical backward must give the same gradients as the tape-based
+    # evaluation for the first and the second derivatives
+    yq0 = _cspline_eval_torch(xq, idxl, xdx, pcoef)
+    yq1 = _CSplineEval.apply(xq, idxl, xdx, pcoef)
+    assert torch.allclose(yq0, yq1)
+    gyq = torch.rand_like(yq0)
+    grads0 = torch.autograd.grad(yq0, params, gyq, create_graph=True)
+    grads1 = torch.autograd.grad(yq1, params, gyq, create_graph=True)
+    for g0, g1 in zip(grads0, grads1):
+        assert torch.allclose(g0, g1)
+    ggrads0 = torch.autograd.grad(sum([g.sum() for g in grads0]), params)
+    ggrads1 = torch.autograd.grad(sum([g.sum() for g in grads1]), params)
+    for g0, g1 in zip(ggrads0, ggrads1):
+        assert torch.allclose(g0, g1)
+
+@device_dtype_float_test(only64=True)
+def test_interp1_solve_tridiag(dtype, device):
+    dtype_device_kwargs = {"dtype": dtype, "device": device}
+    # the number of rows is not 2^k - 1 to check the padding
+    for nr in [1, 2, 6, 13]:
+        diag = torch.rand((2, nr), **dtype_device_kwargs) + 2
+        subdiag = torch.rand((2, nr - 1), **dtype_device_kwargs)
+        supdiag = torch.rand((2, nr - 1), **dtype_device_kwargs)
+        rhs = torch.rand((2, nr, 3), **dtype_device_kwargs)
+        mat = torch.diag_embed(diag) + torch.diag_embed(supdiag, offset=1) + \
+              torch.diag_embed(subdiag, offset=-1)
+        xs = _solve_tridiag(subdiag, diag, supdiag, rhs)
+        assert torch.allclose(torch.matmul(mat, xs), rhs)
+
+@device_dtype_float_test(only64=True)
+def test_interp1_spline_mat_large(dtype, device):
+    dtype_device_kwargs = {"dtype": dtype, "device": device}
+    nr = interp_1d._TRIDIAG_SOLVE_MIN_NR + 30
+    x = torch.linspace(0, 1, nr, **dtype_device_kwargs)
+    x = x + (torch.rand(nr, **dtype_device_kwargs) - 0.5) * 0.5 / (nr - 1)
+
+    # the cyclic reduction for large nr must agree with the dense solver
+    for bc_type in ["natural", "clamped"]:
+        mat_tridiag = interp_1d._get_spline_mat_inv(x, bc_type)
+        min_nr = interp_1d._TRIDIAG_SOLVE_MIN_NR
+        try:
+            interp_1d._TRIDIAG_SOLVE_MIN_NR = nr + 1
+            mat_dense = interp_1d._get_spline_mat_inv(x, bc_type)
+        finally:
+            interp_1d._TRIDIAG_SOLVE_MIN_NR = min_nr
+        atol = 1e-10 * mat_dense.abs().max().item()
+        assert torch.allclose(mat_tridiag, mat_dense, rtol=1e-8, atol=atol)
+
+def _get_random_segments(nbatch_shape, nseg, nrq, dtype, device):
+    # returns random (xq, idxl, xdx, pcoef) for the polynomial evaluation
+    dtype_device_kwargs = {"dtype": dtype, "device": device}
+    xdx = torch.rand((nseg, 2), **dtype_device_kwargs) + 0.5
+    pcoef = torch.rand((*nbatch_shape, nseg, 4), **dtype_device_kwargs)
+    idxl = torch.randint(0, nseg, (nrq,), dtype=torch.long, device=device)
+    xq = xdx[idxl, 0] + torch.rand((nrq,), **dtype_device_kwargs) * xdx[idxl, 1]
+    return xq, idxl, xdx, pcoef
+
+@pytest.mark.skipif(not _cspline_numba.numba_available, reason="numba is not installed")
+def test_interp1_cspline_numba():
+    xq, idxl, xdx, pcoef = _get_random_segments((3, 4), 50, 100, torch.float64, torch.device("cpu"))
+    yq_numba = _cspline_eval_numba(idxl, xdx, pcoef, xq)
+    yq_torch = _cspline_eval_torch(xq, idxl, xdx, pcoef)
+    assert yq_numba.shape == yq_torch.shape
+    assert torch.allclose(yq_numba, yq_torch)
+
+    # the kernel option selects the evaluation regardless of the size
+    x = torch.tensor([0.0, 0.2, 0.3, 0.5, 0.8, 1.0], dtype=torch.float64)
+    y = torch.rand((2, 6), dtype=torch.float64)
+    xq = torch.linspace(0, 1, 10, dtype=torch.float64)
+    yq_numba = Interp1D(x, y, method="cspline", kernel="numba")(xq)
+    yq_torch = Interp1D(x, y, method="cspline", kernel="torch")(xq)
+    assert torch.allclose(yq_numba, yq_torch)
+    with pytest.raises(RuntimeError):
+        Interp1D(x, y, method="cspline", kernel="unknown")
+
+@pytest.mark.skipif(not (_cspline_triton.triton_available and torch.cuda.is_available()),
+                    reason="triton or cuda is not available")
+def test_interp1_cspline_triton():
+    for dtype in [torch.float32, torch.float64]:
+        xq, idxl, xdx, pcoef = _get_random_segments((3, 4), 50, 1000, dtype, torch.device("cuda"))
+        yq_triton = _cspline_triton.cspline_eval(idxl, xdx, pcoef, xq)
+        yq_torch = _cspline_eval_torch(xq, idxl, xdx, pcoef)
+        assert yq_triton.shape == yq_torch.shape
+        assert torch.allclose(yq_triton, yq_torch)
+
+    # the triton kernel is only used if it is chosen explicitly
+    x = torch.tensor([0.0, 0.2, 0.3, 0.5, 0.8, 1.0], device=torch.device("cuda"))
+    y = torch.rand((2, 6), device=torch.device("cuda"))
+    xq = torch.linspace(0, 1, 10, device=torch.device("cuda"))
+    yq_triton = Interp1D(x, y, method="cspline", kernel="triton")(xq)
+    yq_torch = Interp1D(x, y, method="cspline", kernel="torch")(xq)
+    assert torch.allclose(yq_triton, yq_torch)
+
 if __name__ == "__main__":
     test_interp1_cspline()
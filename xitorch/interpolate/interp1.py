@@ -13,7 +13,8 @@ class Interp1D(EditableModule):
     Arguments
     ---------
     x: torch.Tensor
-        The position of known values in tensor with shape ``(nr,)``
+        The position of known values in tensor with shape ``(nr,)``, sorted in
+        ascending order
     y: torch.Tensor or None
         The values at the given position with shape ``(*BY, nr)``.
         If ``None``, it must be supplied during ``__call__``
@@ -40,6 +41,23 @@ class Interp1D(EditableModule):
         -------
         torch.Tensor
             The interpolated values with shape ``(*BY, nrq)``.
+
+    interp_batch(self, xq, ys)
+
+        Arguments
+        ----------------
+        xq: torch.Tensor
+            The position of query points with shape ``(nrq,)``.
+        ys: list of torch.Tensor
+            List of values at the given position, all with the same shape
+            ``(*BY, nr)``. They are interpolated together in a single batch.
+            It can only be used if ``y`` is not specified during ``__init__``.
+
+        Returns
+        -------
+        list of torch.Tensor
+            The interpolated values of every tensor in ``ys`` with shape
+            ``(*BY, nrq)``.
     """
     def __init__(self, x, y=None, method=None, **fwd_options):
         if method is None:
@@ -52,6 +70,9 @@ class Interp1D(EditableModule):
     def __call__(self, xq, y=None):
         return self.obj(xq, y)
 
+    def interp_batch(self, xq, ys):
+        return self.obj.interp_batch(xq, ys)
+
     def getparamnames(self, methodname, prefix=""):
         return [prefix+"obj."+c for c in self.obj.getparamnames()]
 